@@ -0,0 +1,436 @@
+# Índice de prefixos em memória para o autocomplete de títulos/diretores
+
+import argparse
+import heapq
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models.comment import Comment
+from .models.movie import Movie
+
+logger = logging.getLogger(__name__)
+
+# Maior code point possível: fecha o intervalo de chaves que começam com o prefixo
+_PREFIX_END = "\U0010ffff"
+
+# Prefixos até este tamanho têm o ranking pré-calculado (ex: "a", "th", "god")
+SHORT_PREFIX_LEN = 3
+
+
+def fold(text: Optional[str]) -> str:
+    """Normaliza o texto para busca: remove acentos e ignora maiúsculas/minúsculas."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def _keys_for(name: Optional[str], director: Optional[str]) -> List[str]:
+    """
+    Gera as chaves indexadas de um filme: o texto completo e cada sufixo a partir
+    de uma palavra, para que "godf" encontre "The Godfather".
+    """
+    keys = set()
+    for value in (name, director):
+        words = fold(value).split(" ")
+        for i in range(len(words)):
+            key = " ".join(words[i:])
+            if key:
+                keys.add(key)
+    return sorted(keys)
+
+
+def _short_prefixes(keys: List[str]) -> set:
+    # rstrip(): prefixos terminados em espaço são consultados sem ele (ver fold())
+    return {key[:n].rstrip() for key in keys for n in range(1, SHORT_PREFIX_LEN + 1)}
+
+
+def _all_prefixes(keys: List[str]) -> set:
+    return {key[:n].rstrip() for key in keys for n in range(1, len(key) + 1)}
+
+
+class _Ranking:
+    """Os filmes mais populares de um prefixo, ordenados por (-score, nome, id)."""
+
+    __slots__ = ("top", "total")
+
+    def __init__(self, top: List[tuple], total: int):
+        self.top = top # Limitado a PrefixIndex.capacity
+        self.total = total # Quantos filmes casam com o prefixo
+
+
+class PrefixIndex:
+    """
+    Array ordenado de (chave, movie_id) consultado com bisect, mais o ranking
+    (top-N) de cada prefixo. Prefixos de até SHORT_PREFIX_LEN caracteres, que casam
+    com boa parte do catálogo, têm o ranking calculado no build(); os mais longos são
+    calculados na primeira consulta e ficam em cache. Cada escrita ajusta só os
+    rankings dos prefixos do filme alterado.
+    As leituras não tocam no banco; as rotas de escrita mantêm o índice atualizado.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        # Folga acima do limite máximo: remoções só exigem recalcular o ranking
+        # depois que ele cai abaixo do `limit` pedido
+        self.capacity = capacity or 2 * settings.AUTOCOMPLETE_MAX_LIMIT
+        self._entries: List[Tuple[str, int]] = []
+        self._keys_by_movie: Dict[int, List[str]] = {}
+        self._movies: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._scores: Dict[int, float] = {}
+        self._short: Dict[str, _Ranking] = {} # Prefixos curtos (sempre presentes)
+        self._cache: Dict[str, _Ranking] = {} # Prefixos longos já consultados
+        self._journal: Optional[list] = None # Escritas ocorridas durante um build()
+        self._rescore: Optional[set] = None # Filmes comentados durante um build()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def begin_build(self) -> None:
+        """
+        Marca o início de uma reconstrução: as escritas feitas até o build() terminar
+        são registradas e reaplicadas sobre o novo índice (build em segundo plano).
+        Comentários não são reaplicados como deltas, pois a leitura do build pode já
+        incluí-los: os filmes afetados são devolvidos por take_rescore().
+        """
+        with self._lock:
+            self._journal = []
+            self._rescore = set()
+
+    def abort_build(self) -> None:
+        """Descarta o registro de escritas de um build que falhou (o índice atual continua valendo)."""
+        with self._lock:
+            self._journal = None
+            self._rescore = None
+
+    def build(self, rows) -> None:
+        """Reconstrói o índice a partir de tuplas (id, name, director, score)."""
+        entries = []
+        keys_by_movie = {}
+        movies = {}
+        scores = {}
+        for movie_id, name, director, score in rows:
+            keys = _keys_for(name, director)
+            entries.extend((key, movie_id) for key in keys)
+            keys_by_movie[movie_id] = keys
+            movies[movie_id] = (name, director)
+            scores[movie_id] = score or 0
+        entries.sort()
+
+        # Rankings dos prefixos curtos: percorre os filmes do mais para o menos
+        # popular, então cada lista já sai ordenada
+        short: Dict[str, _Ranking] = {}
+        capacity = self.capacity
+        for rank in sorted((-scores[i], movies[i][0], i) for i in movies):
+            for prefix in _short_prefixes(keys_by_movie[rank[2]]):
+                ranking = short.get(prefix)
+                if ranking is None:
+                    short[prefix] = _Ranking([rank], 1)
+                else:
+                    ranking.total += 1
+                    if len(ranking.top) < capacity:
+                        ranking.top.append(rank)
+
+        with self._lock:
+            self._entries = entries
+            self._keys_by_movie = keys_by_movie
+            self._movies = movies
+            self._scores = scores
+            self._short = short
+            self._cache = {}
+            journal, self._journal = self._journal or [], None
+            for op, args in journal:
+                op(*args)
+
+    def _record(self, op, *args) -> None:
+        # Durante um build() em andamento, guarda a escrita para reaplicar no índice novo
+        if self._journal is not None:
+            self._journal.append((op, args))
+
+    def _rank(self, movie_id: int) -> tuple:
+        return (-self._scores.get(movie_id, 0), self._movies[movie_id][0], movie_id)
+
+    def _rankings_for(self, keys: List[str]):
+        """Rankings existentes (curtos e em cache) afetados por um filme com essas chaves."""
+        # Sem prefixos longos em cache, basta olhar os curtos
+        for prefix in _all_prefixes(keys) if self._cache else _short_prefixes(keys):
+            ranking = (self._short if len(prefix) <= SHORT_PREFIX_LEN else self._cache).get(prefix)
+            if ranking is not None:
+                yield prefix, ranking
+
+    def _unrank_locked(self, movie_id: int) -> None:
+        """Tira o filme dos rankings dos seus prefixos."""
+        rank = self._rank(movie_id)
+        for prefix, ranking in list(self._rankings_for(self._keys_by_movie[movie_id])):
+            pos = bisect_left(ranking.top, rank)
+            if pos < len(ranking.top) and ranking.top[pos] == rank:
+                del ranking.top[pos]
+            ranking.total -= 1
+            if ranking.total <= 0:
+                del (self._short if len(prefix) <= SHORT_PREFIX_LEN else self._cache)[prefix]
+
+    def _rerank_locked(self, movie_id: int) -> None:
+        """Coloca o filme nos rankings dos seus prefixos, conforme o score atual."""
+        rank = self._rank(movie_id)
+        keys = self._keys_by_movie[movie_id]
+        for prefix, ranking in self._rankings_for(keys):
+            # Se o ranking está truncado, um filme abaixo do último pode estar
+            # atrás de outros que ficaram de fora
+            complete = ranking.total == len(ranking.top)
+            ranking.total += 1
+            if complete or (ranking.top and rank < ranking.top[-1]):
+                insort(ranking.top, rank)
+                if len(ranking.top) > self.capacity:
+                    ranking.top.pop()
+        for prefix in _short_prefixes(keys):
+            if prefix not in self._short:
+                self._short[prefix] = _Ranking([rank], 1)
+
+    def _remove_locked(self, movie_id: int) -> None:
+        if movie_id not in self._movies:
+            return
+        self._unrank_locked(movie_id)
+        for key in self._keys_by_movie.pop(movie_id):
+            pos = bisect_left(self._entries, (key, movie_id))
+            if pos < len(self._entries) and self._entries[pos] == (key, movie_id):
+                del self._entries[pos]
+        del self._movies[movie_id]
+
+    def _upsert_locked(self, movie_id: int, name: str, director: Optional[str], score: Optional[float]) -> None:
+        self._remove_locked(movie_id)
+        keys = _keys_for(name, director)
+        for key in keys:
+            insort(self._entries, (key, movie_id))
+        self._keys_by_movie[movie_id] = keys
+        self._movies[movie_id] = (name, director)
+        if score is not None:
+            self._scores[movie_id] = score
+        else:
+            self._scores.setdefault(movie_id, 0)
+        self._rerank_locked(movie_id)
+
+    def upsert(self, movie_id: int, name: str, director: Optional[str], score: Optional[float] = None) -> None:
+        """Insere ou atualiza um filme no índice."""
+        with self._lock:
+            self._record(self._upsert_locked, movie_id, name, director, score)
+            self._upsert_locked(movie_id, name, director, score)
+
+    def upsert_many(self, rows) -> None:
+        """Insere ou atualiza vários filmes de uma vez: tuplas (id, name, director, score)."""
+        with self._lock:
+            for movie_id, name, director, score in rows:
+                self._record(self._upsert_locked, movie_id, name, director, score)
+                self._upsert_locked(movie_id, name, director, score)
+
+    def remove(self, movie_id: int) -> None:
+        """Remove um filme do índice."""
+        with self._lock:
+            self._record(self._delete_locked, movie_id)
+            self._delete_locked(movie_id)
+
+    def _delete_locked(self, movie_id: int) -> None:
+        self._remove_locked(movie_id)
+        self._scores.pop(movie_id, None)
+
+    def add_score(self, movie_id: int, delta: float) -> None:
+        """Ajusta a popularidade de um filme (ex: novo comentário)."""
+        with self._lock:
+            if self._rescore is not None:
+                self._rescore.add(movie_id)
+            self._add_score_locked(movie_id, delta)
+
+    def take_rescore(self) -> set:
+        """
+        Filmes comentados desde o begin_build(), cuja popularidade deve ser relida do
+        banco e gravada com set_scores(). Retorna vazio (e encerra o registro) quando
+        não houve novos comentários desde a chamada anterior.
+        """
+        with self._lock:
+            movie_ids = self._rescore or set()
+            self._rescore = set() if movie_ids else None
+            return movie_ids
+
+    def set_scores(self, scores: Dict[int, float]) -> None:
+        """Grava a popularidade absoluta dos filmes informados."""
+        with self._lock:
+            for movie_id, score in scores.items():
+                if movie_id in self._movies:
+                    self._unrank_locked(movie_id)
+                    self._scores[movie_id] = score
+                    self._rerank_locked(movie_id)
+
+    def _add_score_locked(self, movie_id: int, delta: float) -> None:
+        if movie_id in self._movies:
+            self._unrank_locked(movie_id)
+            self._scores[movie_id] = self._scores.get(movie_id, 0) + delta
+            self._rerank_locked(movie_id)
+
+    def _compute_locked(self, folded: str) -> _Ranking:
+        """Ranking de um prefixo a partir do array ordenado (faixa de chaves com bisect)."""
+        start = bisect_left(self._entries, (folded,))
+        end = bisect_left(self._entries, (folded + _PREFIX_END,), lo=start)
+        ids = {movie_id for _, movie_id in self._entries[start:end]}
+        return _Ranking(heapq.nsmallest(self.capacity, map(self._rank, ids)), len(ids))
+
+    def search(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Retorna os `limit` filmes mais populares cujo título ou diretor começa com o prefixo."""
+        folded = fold(prefix)
+        if not folded:
+            return []
+        limit = min(limit, self.capacity)
+
+        with self._lock:
+            table = self._short if len(folded) <= SHORT_PREFIX_LEN else self._cache
+            ranking = table.get(folded)
+            if ranking is None and table is self._short:
+                return [] # Nenhum filme tem esse prefixo curto
+            # Recalcula se nunca foi consultado ou se remoções deixaram o ranking
+            # truncado com menos itens que o pedido
+            if ranking is None or len(ranking.top) < min(limit, ranking.total):
+                ranking = self._compute_locked(folded)
+                if table is self._cache and folded not in table and len(table) >= settings.AUTOCOMPLETE_CACHE_SIZE:
+                    table.clear()
+                if ranking.total:
+                    table[folded] = ranking
+            return [
+                {"id": i, "name": self._movies[i][0], "director": self._movies[i][1]}
+                for _, _, i in ranking.top[:limit]
+            ]
+
+
+def movie_score(movie: Movie, comment_count: int = 0) -> float:
+    """Calcula a popularidade de um filme conforme AUTOCOMPLETE_POPULARITY."""
+    if settings.AUTOCOMPLETE_POPULARITY == "release_year":
+        return movie.release_year or 0
+    return comment_count
+
+
+def _comment_counts(db: Session, movie_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    query = db.query(Comment.movie_id, func.count(Comment.id))
+    if movie_ids is None:
+        return dict(query.group_by(Comment.movie_id).all())
+    counts = {}
+    for i in range(0, len(movie_ids), 500): # SQLite limita os parâmetros por consulta
+        counts.update(
+            query.filter(Comment.movie_id.in_(movie_ids[i:i + 500])).group_by(Comment.movie_id).all()
+        )
+    return counts
+
+
+def build_from_db(db: Session) -> None:
+    """Carrega todos os filmes do banco no índice (usado na inicialização)."""
+    movie_index.begin_build()
+    try:
+        counts = _comment_counts(db)
+        movies = db.query(Movie.id, Movie.name, Movie.director, Movie.release_year).all()
+        movie_index.build(
+            (m.id, m.name, m.director, movie_score(m, counts.get(m.id, 0))) for m in movies
+        )
+        # Filmes comentados durante o build: relê a contagem absoluta, já que a leitura
+        # acima pode ou não ter incluído esses comentários. Repete até não haver novos.
+        movie_ids = movie_index.take_rescore()
+        while movie_ids:
+            db.rollback() # Nova transação: enxerga os commits feitos desde a leitura acima
+            counts = _comment_counts(db, sorted(movie_ids))
+            movie_index.set_scores({movie_id: counts.get(movie_id, 0) for movie_id in movie_ids})
+            movie_ids = movie_index.take_rescore()
+    except Exception:
+        # Sem isso as escritas seguiriam sendo registradas para sempre (ex: FAST_START,
+        # onde o erro morre na thread de fundo)
+        movie_index.abort_build()
+        logger.exception("Falha ao construir o índice do autocomplete")
+        raise
+
+
+def index_movie(movie: Movie) -> None:
+    """Atualiza o índice após criar/alterar um filme (mantém a popularidade atual)."""
+    score = movie_score(movie) if settings.AUTOCOMPLETE_POPULARITY == "release_year" else None
+    movie_index.upsert(movie.id, movie.name, movie.director, score)
+
+
+def index_movies(db: Session, movie_ids: List[int]) -> None:
+    """Recarrega do banco os filmes informados e atualiza o índice uma única vez (edições em lote)."""
+    if not movie_ids:
+        return
+    use_year = settings.AUTOCOMPLETE_POPULARITY == "release_year"
+    movies = []
+    for i in range(0, len(movie_ids), 500): # SQLite limita os parâmetros por consulta
+        movies.extend(
+            db.query(Movie.id, Movie.name, Movie.director, Movie.release_year)
+            .filter(Movie.id.in_(movie_ids[i:i + 500]))
+            .all()
+        )
+    movie_index.upsert_many(
+        (m.id, m.name, m.director, movie_score(m) if use_year else None) for m in movies
+    )
+
+
+def comment_added(movie_id: int, delta: int = 1) -> None:
+    """Reflete novos comentários (ou remoções, com delta negativo) na popularidade."""
+    if settings.AUTOCOMPLETE_POPULARITY == "comments":
+        movie_index.add_score(movie_id, delta)
+
+
+# Instância única compartilhada pela aplicação
+movie_index = PrefixIndex()
+
+
+def main(argv=None) -> int:
+    """Benchmark do índice com um catálogo sintético (não usa o banco)."""
+    parser = argparse.ArgumentParser(description="Mede o autocomplete com um catálogo sintético.")
+    parser.add_argument("--movies", type=int, default=200000, help="Tamanho do catálogo")
+    parser.add_argument("--queries", type=int, default=2000, help="Consultas por prefixo")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="Orçamento por consulta (p99)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    syllables = ["a", "ba", "ca", "da", "el", "fo", "go", "ha", "in", "ju", "ka", "lo", "ma",
+                 "ne", "or", "pa", "qu", "ro", "sa", "te", "ul", "vi", "wa", "xe", "yo", "ze"]
+
+    def word():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+
+    rows = [
+        (i, " ".join(word() for _ in range(rng.randint(1, 4))).title(),
+         f"{word()} {word()}".title(), rng.randint(0, 500))
+        for i in range(1, args.movies + 1)
+    ]
+    index = PrefixIndex()
+    started = time.perf_counter()
+    index.begin_build()
+    index.build(rows)
+    print(f"build de {args.movies} filmes: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # Cada consulta é intercalada com um novo comentário, como em produção
+    over_budget = False
+    for prefix in ("a", "m", "ba", "sa", "gol", "the", "maro", "kaju sa"):
+        samples = []
+        for _ in range(args.queries):
+            index.add_score(rng.randint(1, args.movies), 1)
+            started = time.perf_counter()
+            index.search(prefix, settings.AUTOCOMPLETE_DEFAULT_LIMIT)
+            samples.append((time.perf_counter() - started) * 1000)
+        p99 = statistics.quantiles(samples, n=100)[98]
+        print(f"  {prefix!r:10} mediana {statistics.median(samples):.3f} ms  p99 {p99:.3f} ms")
+        over_budget = over_budget or p99 > args.budget_ms
+
+    if over_budget:
+        print("ORÇAMENTO DE LATÊNCIA EXCEDIDO")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
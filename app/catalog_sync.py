@@ -0,0 +1,324 @@
+# Sincronização incremental do catálogo a partir do feed de metadados
+#
+#   python -m app.catalog_sync feed.json [--dry-run] [--no-delete] [--force]
+#
+# Cada filme do feed é casado pela chave natural (external_id, ou nome + ano) e
+# comparado pelo hash do conteúdo com o último estado sincronizado (tabela
+# catalog_sync). Só as inserções, atualizações e remoções necessárias são
+# gravadas, em lote e em uma única transação.
+#
+# Uma correção de título ou ano muda a chave nome + ano: o filme antigo some do
+# feed e aparece um "novo". Antes de remover, cada filme sumido é casado com um
+# item novo que só difere no nome (ou só no ano) e atualizado no lugar. Filmes
+# com comentários nunca são removidos sem --force; eles são listados no resultado.
+#
+# Pelo CLI, o índice do autocomplete de uma API já em execução só reflete as
+# alterações após reiniciar; pelo endpoint POST /movies/sync ele é atualizado na hora.
+
+import argparse
+import hashlib
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+
+from . import counters
+from .autocomplete import fold
+from .config import settings
+from .models.catalog_sync import CatalogSyncEntry
+from .models.comment import Comment
+from .models.movie import Movie
+from .schemas import MovieSyncItem
+
+MOVIE_FIELDS = ("name", "photo", "duration", "release_year", "description", "banner_url", "director", "genre")
+
+# Máximo de IDs por cláusula IN (SQLite limita o número de parâmetros por consulta)
+IN_CHUNK_SIZE = 500
+
+
+class CatalogSyncError(Exception):
+    """Sincronização recusada (ex: remoções acima do limite de segurança)."""
+
+
+def sync_key(external_id: Optional[str], name: str, release_year: Optional[int]) -> str:
+    """Chave natural de um filme do feed."""
+    if external_id:
+        return f"ext:{external_id}"
+    return f"{fold(name)}|{release_year if release_year is not None else ''}"
+
+
+def content_hash(values: dict, exclude: Tuple[str, ...] = ()) -> str:
+    """SHA-256 dos campos do filme (menos `exclude`), independente da ordem das chaves."""
+    payload = json.dumps(
+        {f: values.get(f) for f in MOVIE_FIELDS if f not in exclude}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def validate_items(raw) -> Tuple[List[dict], List[str]]:
+    """
+    Valida os itens de um feed lido do disco com o mesmo schema do endpoint
+    (MovieSyncItem). Retorna (itens normalizados, erros "item N: campo: mensagem").
+    """
+    if not isinstance(raw, list):
+        return [], ["o feed deve ser uma lista de filmes"]
+    items: List[dict] = []
+    errors: List[str] = []
+    for position, item in enumerate(raw):
+        try:
+            items.append(MovieSyncItem.model_validate(item).model_dump())
+        except ValidationError as e:
+            details = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+            )
+            errors.append(f"item {position}: {details}")
+    return items, errors
+
+
+def _chunks(values: List[int]):
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[i:i + IN_CHUNK_SIZE]
+
+
+def _pair_renamed(db: Session, vanished: Dict[str, int], new_items: List[dict]) -> List[Tuple[int, str]]:
+    """
+    Casa filmes sincronizados que sumiram do feed (chave -> movie_id) com itens novos
+    que só diferem deles no nome ou só no ano. Só aceita pares sem ambiguidade.
+    Retorna [(índice em new_items, chave antiga)].
+    """
+    if not vanished or not new_items:
+        return []
+    by_movie = {movie_id: key for key, movie_id in vanished.items()}
+    columns = [Movie.id] + [getattr(Movie, f) for f in MOVIE_FIELDS]
+    current = {}
+    for chunk in _chunks(list(by_movie)):
+        current.update((row.id, row._asdict()) for row in db.query(*columns).filter(Movie.id.in_(chunk)))
+
+    pairs = []
+    free_items = set(range(len(new_items)))
+    for exclude in (("name",), ("release_year",)):
+        old_by_hash = defaultdict(list)
+        for movie_id, values in current.items():
+            old_by_hash[content_hash(values, exclude)].append(movie_id)
+        new_by_hash = defaultdict(list)
+        for i in free_items:
+            new_by_hash[content_hash(new_items[i], exclude)].append(i)
+        for digest, movie_ids in old_by_hash.items():
+            items = new_by_hash.get(digest, [])
+            if len(movie_ids) == 1 and len(items) == 1:
+                pairs.append((items[0], by_movie[movie_ids[0]]))
+                free_items.discard(items[0])
+                del current[movie_ids[0]]
+    return pairs
+
+
+def _upsert_sync_entries(db: Session, rows: List[dict]) -> None:
+    """INSERT ... ON CONFLICT (sync_key) DO UPDATE em lote."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        # Outros bancos: remove e reinsere as chaves afetadas
+        keys = [r["sync_key"] for r in rows]
+        for i in range(0, len(keys), IN_CHUNK_SIZE):
+            db.execute(delete(CatalogSyncEntry).where(CatalogSyncEntry.sync_key.in_(keys[i:i + IN_CHUNK_SIZE])))
+        db.execute(insert(CatalogSyncEntry), rows)
+        return
+
+    stmt = dialect_insert(CatalogSyncEntry)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogSyncEntry.sync_key],
+        set_={"movie_id": stmt.excluded.movie_id, "content_hash": stmt.excluded.content_hash},
+    )
+    db.execute(stmt, rows)
+
+
+def sync_catalog(db: Session, items: Iterable[dict], delete_missing: bool = True,
+                 dry_run: bool = False, force: bool = False) -> dict:
+    """
+    Aplica o feed ao catálogo. `items` são dicts com os campos de MovieCreate e,
+    opcionalmente, `external_id`. Retorna as contagens e os IDs afetados.
+    Filmes criados fora do feed são adotados quando a chave nome + ano coincide.
+    `renamed` (incluídos em `updated`) são filmes cuja chave mudou por correção de
+    nome ou ano; `kept` são filmes ausentes do feed mantidos por terem comentários.
+    """
+    # Feed indexado pela chave natural (a última ocorrência vence)
+    feed: Dict[str, dict] = {}
+    for item in items:
+        values = {f: item.get(f) for f in MOVIE_FIELDS}
+        feed[sync_key(item.get("external_id"), values["name"], values["release_year"])] = values
+
+    # Estado atual: filmes já sincronizados (chave -> (movie_id, hash))
+    synced = {
+        row.sync_key: (row.movie_id, row.content_hash)
+        for row in db.query(CatalogSyncEntry.sync_key, CatalogSyncEntry.movie_id, CatalogSyncEntry.content_hash)
+    }
+
+    # Filmes sem estado de sincronização que o feed pode adotar pela chave nome + ano
+    # (primeira execução sobre um catálogo criado pela API)
+    fallback_keys = {
+        key: sync_key(None, values["name"], values["release_year"])
+        for key, values in feed.items() if key not in synced
+    }
+    adoptable = {}
+    if fallback_keys:
+        wanted = set(fallback_keys.values())
+        columns = [Movie.id] + [getattr(Movie, f) for f in MOVIE_FIELDS]
+        query = db.query(*columns).outerjoin(CatalogSyncEntry, CatalogSyncEntry.movie_id == Movie.id)
+        for row in query.filter(CatalogSyncEntry.movie_id.is_(None)):
+            key = sync_key(None, row.name, row.release_year)
+            if key in wanted and key not in adoptable:
+                adoptable[key] = (row.id, content_hash(row._asdict()))
+
+    to_insert: List[tuple] = []  # (chave, valores, hash)
+    to_update: List[dict] = []
+    sync_rows: List[dict] = []
+    unchanged = 0
+    for key, values in feed.items():
+        new_hash = content_hash(values)
+        current = synced.get(key)
+        adopted = current is None and fallback_keys[key] in adoptable
+        if adopted:
+            current = adoptable.pop(fallback_keys[key]) # Cada filme é adotado uma vez só
+        if current is None:
+            to_insert.append((key, values, new_hash))
+            continue
+        movie_id, old_hash = current
+        if old_hash == new_hash:
+            unchanged += 1
+            if adopted:
+                sync_rows.append({"movie_id": movie_id, "sync_key": key, "content_hash": new_hash})
+            continue
+        to_update.append(dict(values, id=movie_id))
+        sync_rows.append({"movie_id": movie_id, "sync_key": key, "content_hash": new_hash})
+
+    # Títulos/anos corrigidos na origem: o filme sumido é atualizado no lugar
+    vanished = {key: movie_id for key, (movie_id, _) in synced.items() if key not in feed}
+    renamed_ids: List[int] = []
+    paired = _pair_renamed(db, vanished, [values for _, values, _ in to_insert])
+    for i, old_key in paired:
+        key, values, new_hash = to_insert[i]
+        movie_id = vanished.pop(old_key)
+        renamed_ids.append(movie_id)
+        to_update.append(dict(values, id=movie_id))
+        sync_rows.append({"movie_id": movie_id, "sync_key": key, "content_hash": new_hash})
+    paired_items = {i for i, _ in paired}
+    to_insert = [item for i, item in enumerate(to_insert) if i not in paired_items]
+
+    to_delete = list(vanished.values()) if delete_missing else []
+    # Filmes com comentários só são removidos com force
+    kept: List[int] = []
+    if to_delete and not force:
+        commented = set()
+        for chunk in _chunks(to_delete):
+            commented.update(
+                movie_id for (movie_id,) in
+                db.query(Comment.movie_id).filter(Comment.movie_id.in_(chunk)).distinct()
+            )
+        kept = [movie_id for movie_id in to_delete if movie_id in commented]
+        to_delete = [movie_id for movie_id in to_delete if movie_id not in commented]
+    if to_delete and not force and len(to_delete) > settings.CATALOG_SYNC_MAX_DELETE_RATIO * max(len(synced), 1):
+        raise CatalogSyncError(
+            f"O feed removeria {len(to_delete)} de {len(synced)} filmes sincronizados; "
+            "use force para confirmar"
+        )
+
+    inserted_ids: List[int] = []
+    if not dry_run:
+        if to_insert:
+            # INSERT em lote com RETURNING, na mesma ordem dos parâmetros
+            result = db.execute(
+                insert(Movie).returning(Movie.id, sort_by_parameter_order=True),
+                [values for _, values, _ in to_insert],
+            )
+            inserted_ids = [row.id for row in result]
+            sync_rows.extend(
+                {"movie_id": movie_id, "sync_key": key, "content_hash": new_hash}
+                for movie_id, (key, _, new_hash) in zip(inserted_ids, to_insert)
+            )
+        if to_update:
+            db.execute(update(Movie), to_update) # executemany por chave primária
+        for chunk in _chunks(renamed_ids): # A chave antiga dá lugar à nova
+            db.execute(delete(CatalogSyncEntry).where(CatalogSyncEntry.movie_id.in_(chunk)))
+        _upsert_sync_entries(db, sync_rows)
+        for chunk in _chunks(to_delete):
+            db.execute(delete(CatalogSyncEntry).where(CatalogSyncEntry.movie_id.in_(chunk)))
+            db.execute(delete(Comment).where(Comment.movie_id.in_(chunk)))
+            db.execute(delete(Movie).where(Movie.id.in_(chunk)))
+        counters.adjust(db, counters.MOVIES, len(to_insert) - len(to_delete))
+        counters.remove(db, (counters.comments_key(movie_id) for movie_id in to_delete))
+        db.commit()
+    else:
+        db.rollback()
+
+    return {
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "renamed": len(renamed_ids),
+        "kept": len(kept),
+        "unchanged": unchanged,
+        "dry_run": dry_run,
+        "inserted_ids": inserted_ids,
+        "updated_ids": [row["id"] for row in to_update],
+        "deleted_ids": to_delete,
+        "kept_ids": kept,
+    }
+
+
+def main(argv=None) -> int:
+    from .database import SessionLocal, engine, Base
+
+    parser = argparse.ArgumentParser(description="Sincroniza o catálogo com um feed JSON (lista de filmes).")
+    parser.add_argument("feed", help="Arquivo JSON com a lista completa de filmes ('-' para stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="Só calcula as alterações, sem gravar")
+    parser.add_argument("--no-delete", action="store_true", help="Não remove filmes ausentes do feed")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignora o limite de remoções e remove também filmes com comentários")
+    args = parser.parse_args(argv)
+
+    with (sys.stdin if args.feed == "-" else open(args.feed, encoding="utf-8")) as f:
+        items, errors = validate_items(json.load(f))
+    if errors:
+        # Um item ignorado seria tratado como ausente do feed (e removido): recusa tudo
+        print(f"Feed inválido, nada foi gravado ({len(errors)} item(ns) com erro):")
+        for error in errors[:50]:
+            print(f"  {error}")
+        if len(errors) > 50:
+            print(f"  ... e mais {len(errors) - 50}")
+        return 1
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        counters.ensure_initialized(db)
+        result = sync_catalog(db, items, delete_missing=not args.no_delete, dry_run=args.dry_run, force=args.force)
+    except CatalogSyncError as e:
+        print(f"Sincronização recusada: {e}")
+        return 1
+    finally:
+        db.close()
+    print(
+        f"Inseridos: {result['inserted']}  Atualizados: {result['updated']}  "
+        f"Removidos: {result['deleted']}  Renomeados: {result['renamed']}  "
+        f"Sem alteração: {result['unchanged']}"
+        + ("  (dry-run)" if result["dry_run"] else "")
+    )
+    if result["kept"]:
+        print(
+            f"Mantidos por terem comentários (use --force para remover): {result['kept']} "
+            f"(IDs: {', '.join(map(str, result['kept_ids']))})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
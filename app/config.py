@@ -15,10 +15,40 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "seu_super_segredo_aqui_troque_isso"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 45 # Tokens expiram em 30 minutos
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS: int = 3600 # Intervalo da limpeza de refresh tokens expirados
 
     # Configurações Adicionais (opcional)
     PROJECT_NAME: str = "CatFrame API"
     API_V1_STR: str = "/api/v1" # Prefixo para versionamento futuro
+    STARTUP_BUDGET_MS: float = 1000 # Orçamento de import + lifespan (python -m app.startup_profile)
+    FAST_START: bool = False # Constrói os índices em memória em segundo plano, sem atrasar a inicialização
+
+    # Configurações do Autocomplete
+    AUTOCOMPLETE_POPULARITY: str = "comments" # "comments" (nº de comentários) ou "release_year"
+    AUTOCOMPLETE_DEFAULT_LIMIT: int = 10
+    AUTOCOMPLETE_MAX_LIMIT: int = 50
+    AUTOCOMPLETE_CACHE_SIZE: int = 4096 # Máximo de prefixos em cache
+
+    # Configurações do índice de filmes semelhantes (python -m app.similarity)
+    SIMILARITY_INDEX_DIR: str = "./similarity_index"
+    SIMILARITY_TOP_K: int = 20
+    SIMILARITY_USE_DESCRIPTION: bool = False # Incluir termos da descrição nos vetores
+    SIMILARITY_BLOCK_SIZE: int = 256 # Linhas por multiplicação de matrizes (limita memória)
+    SIMILARITY_REBUILD_RATIO: float = 0.1 # Acima desta fração de filmes alterados, update_index refaz o índice
+
+    # Contagens totais das listagens (header X-Total-Count)
+    COUNT_CACHE_TTL_SECONDS: float = 30 # Validade das contagens de consultas com filtro
+
+    # Sincronização do catálogo (POST /movies/sync, python -m app.catalog_sync)
+    CATALOG_SYNC_MAX_DELETE_RATIO: float = 0.1 # Recusa remover mais que isso do catálogo sem 'force'
+
+    # Agrupamento de commits de comentários (útil em SQLite sob rajadas de escrita)
+    COMMENT_BATCHING_ENABLED: bool = False
+    COMMENT_BATCH_WINDOW_MS: float = 5 # Janela para juntar inserções concorrentes
+    COMMENT_BATCH_MAX_ROWS: int = 100 # Linhas por transação
+    COMMENT_BATCH_MAX_PENDING: int = 10000 # Acima disso as requisições gravam diretamente
+    COMMENT_BATCH_SUBMIT_TIMEOUT_SECONDS: float = 5 # Espera máxima na fila antes de gravar diretamente
 
     class Config:
         # Permite carregar de um arquivo .env
@@ -0,0 +1,162 @@
+# Contagens totais para as listagens paginadas (header X-Total-Count)
+#
+# Contagens sem filtro (filmes, usuários, comentários por filme) vêm da tabela
+# row_counters, atualizada na mesma transação de cada escrita. Contagens com
+# filtro usam um COUNT(*) guardado em cache por COUNT_CACHE_TTL_SECONDS.
+#
+# Reconstrução manual (ex: após importar dados por fora da API):
+#   python -m app.counters --rebuild
+
+import argparse
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models.comment import Comment
+from .models.counter import RowCounter
+from .models.movie import Movie
+from .models.user import User
+
+MOVIES = "movies"
+USERS = "users"
+# Gravado pelo rebuild(): sem ele os contadores existentes não são confiáveis
+# (ex: um CLI que somou uma inserção antes da primeira inicialização da API)
+INITIALIZED = "_initialized"
+
+# Chave do advisory lock do PostgreSQL que serializa a inicialização entre workers
+_INIT_LOCK_KEY = 0x726F7763 # "rowc"
+
+
+def comments_key(movie_id: int) -> str:
+    return f"comments:{movie_id}"
+
+
+def adjust(db: Session, name: str, delta: int) -> None:
+    """Soma `delta` ao contador, na transação corrente (o commit fica com o chamador)."""
+    if not delta:
+        return
+    updated = db.query(RowCounter).filter(RowCounter.name == name).update(
+        {RowCounter.value: RowCounter.value + delta}, synchronize_session=False
+    )
+    if updated:
+        return
+    # Contador ainda não existe (ex: primeiro comentário do filme)
+    try:
+        with db.begin_nested():
+            db.add(RowCounter(name=name, value=delta))
+    except IntegrityError:
+        # Criado por outra transação no meio tempo
+        db.query(RowCounter).filter(RowCounter.name == name).update(
+            {RowCounter.value: RowCounter.value + delta}, synchronize_session=False
+        )
+
+
+def remove(db: Session, names: Iterable[str]) -> None:
+    """Apaga contadores (ex: comentários de filmes removidos)."""
+    names = list(names)
+    for i in range(0, len(names), 500):
+        db.query(RowCounter).filter(RowCounter.name.in_(names[i:i + 500])).delete(synchronize_session=False)
+
+
+def get(db: Session, name: str) -> int:
+    """Valor atual do contador (busca pela chave primária); ausente vale zero."""
+    value = db.query(RowCounter.value).filter(RowCounter.name == name).scalar()
+    return value or 0
+
+
+def rebuild(db: Session) -> int:
+    """Recalcula todos os contadores a partir das tabelas. Retorna quantos foram gravados."""
+    # O DELETE vem primeiro para a transação segurar o lock de escrita durante as contagens
+    db.query(RowCounter).delete(synchronize_session=False)
+    rows = [
+        RowCounter(name=MOVIES, value=db.query(func.count(Movie.id)).scalar()),
+        RowCounter(name=USERS, value=db.query(func.count(User.id)).scalar()),
+    ]
+    for movie_id, count in db.query(Comment.movie_id, func.count(Comment.id)).group_by(Comment.movie_id):
+        rows.append(RowCounter(name=comments_key(movie_id), value=count))
+    db.add_all(rows)
+    db.add(RowCounter(name=INITIALIZED, value=1))
+    db.commit()
+    return len(rows)
+
+
+def ensure_initialized(db: Session) -> None:
+    """
+    Calcula os contadores a partir dos dados existentes se ainda não foram inicializados.
+    Deve rodar antes do primeiro adjust() de qualquer processo que escreva no banco
+    (lifespan da API e CLIs).
+    """
+    if get(db, INITIALIZED):
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        # Vários workers subindo juntos: só um recalcula, os demais esperam o lock
+        # (liberado no commit do rebuild) e então já encontram o marcador
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _INIT_LOCK_KEY})
+        if get(db, INITIALIZED):
+            db.commit()
+            return
+    try:
+        rebuild(db)
+    except IntegrityError:
+        # Outro processo inicializou no meio tempo: basta que o marcador exista
+        db.rollback()
+        if not get(db, INITIALIZED):
+            raise
+
+
+class CountCache:
+    """Cache em memória com expiração para contagens de consultas filtradas."""
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Instância única compartilhada pela aplicação
+count_cache = CountCache(settings.COUNT_CACHE_TTL_SECONDS)
+
+
+def main(argv=None):
+    from .database import SessionLocal, engine, Base
+
+    parser = argparse.ArgumentParser(description="Manutenção dos contadores de linhas.")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcula todos os contadores")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"{rebuild(db)} contador(es) recalculado(s)")
+        else:
+            for row in db.query(RowCounter).filter(RowCounter.name.in_([MOVIES, USERS])):
+                print(f"{row.name}: {row.value}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
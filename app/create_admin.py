@@ -6,13 +6,15 @@ from app.models.comment import Comment
 from app.database import SessionLocal, engine, Base
 from app.dependencies.security import get_password_hash
 from app.config import settings 
+from app import counters
 
 def create_admin():
-    # Opcional: Criar tabelas se não existirem (útil para execução isolada)
-    # Base.metadata.create_all(bind=engine)
+    # Criar tabelas se não existirem (útil para execução isolada, antes da API subir)
+    Base.metadata.create_all(bind=engine)
     
     db = SessionLocal()
     try:
+        counters.ensure_initialized(db) # Antes do primeiro adjust() neste banco
         # Verificar se o admin já existe
         existing_admin = db.query(User).filter(User.username == "admin").first()
         if existing_admin:
@@ -27,6 +29,7 @@ def create_admin():
             is_admin=True
         )
         db.add(admin)
+        counters.adjust(db, counters.USERS, 1)
         db.commit()
         db.refresh(admin)
         print(f"Usuário administrador 'admin' criado com sucesso. Lembre-se de alterar a senha padrão ('{admin_password}')!")
@@ -1,18 +1,28 @@
+import hashlib
+import hmac
 import secrets # Para gerar tokens seguros
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.user import User
+from ..models.refresh_token import RefreshToken
 from ..schemas import TokenData 
 from ..config import settings 
 
-# Contexto para hashing de senha
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Contexto para hashing de senha: passlib/bcrypt e jose são importados só no primeiro
+# uso, para não pesar no tempo de inicialização da aplicação
+_pwd_context = None
+
+def get_pwd_context():
+    """Retorna o CryptContext único da aplicação, criando-o na primeira chamada."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 # Esquema OAuth2 para obter o token do header Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token") # Ajustar tokenUrl para a rota correta
@@ -21,16 +31,17 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token") # Ajustar tokenUrl
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha fornecida corresponde ao hash armazenado."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Gera o hash bcrypt para uma senha."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 # --- Funções de Token JWT (Acesso) ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Cria um novo token JWT de acesso."""
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -41,6 +52,84 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# --- Funções de Refresh Token ---
+# Renovar a sessão custa um HMAC e uma busca indexada, em vez de um bcrypt no /auth/token.
+
+def hash_refresh_token(token: str) -> str:
+    """HMAC-SHA256 do refresh token (só o hash é guardado no banco)."""
+    return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devolve datetimes sem fuso; todos são gravados em UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def create_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """Cria um refresh token (nova família, ou a informada ao rotacionar). O commit fica com o chamador."""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+def revoke_refresh_token_family(db: Session, family_id: str) -> None:
+    """Revoga todos os tokens ainda ativos de uma família."""
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    """Revoga todas as sessões de um usuário (ex: após redefinir a senha)."""
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, str]:
+    """
+    Troca um refresh token válido por um novo da mesma família.
+    Reapresentar um token já rotacionado/revogado indica vazamento: a família inteira é revogada.
+    """
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido ou expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    stored = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+    if stored is None:
+        raise invalid_exception
+
+    now = datetime.now(timezone.utc)
+    if _as_utc(stored.expires_at) <= now:
+        raise invalid_exception
+
+    # Marca como usado só se ainda estiver ativo: duas renovações simultâneas com o
+    # mesmo token não podem ambas vencer
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+    if rotated != 1:
+        revoke_refresh_token_family(db, stored.family_id)
+        db.commit()
+        raise invalid_exception
+
+    user = db.query(User).filter(User.id == stored.user_id).first()
+    if user is None:
+        db.rollback()
+        raise invalid_exception
+    new_token = create_refresh_token(db, user.id, family_id=stored.family_id)
+    db.commit()
+    return user, new_token
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    """Remove tokens expirados (usado pela limpeza periódica). Retorna quantos foram apagados."""
+    deleted = db.query(RefreshToken).filter(
+        RefreshToken.expires_at < datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
 # --- Funções de Token (Reset de Senha) ---
 
 def create_password_reset_token(username: str) -> str:
@@ -58,6 +147,7 @@ def create_password_reset_token(username: str) -> str:
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     """Dependência para obter o usuário atual a partir do token JWT."""
+    from jose import JWTError, jwt
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
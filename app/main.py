@@ -1,20 +1,65 @@
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 # @ Ajustar imports para serem relativos dentro do pacote 'app'
-from .database import engine, Base
+from .database import engine, Base, SessionLocal
 from .routers import auth, movies, users, comments
 from .config import settings # Importar configurações
+from .autocomplete import build_from_db
+from .counters import ensure_initialized as ensure_counters
+from .routers.comments import comment_batcher
+from .sweeper import PeriodicTask
+from .dependencies.security import purge_expired_refresh_tokens
 
-# Criar tabelas no banco de dados (se não existirem)
-# Em produção, considere usar Alembic para migrações
-Base.metadata.create_all(bind=engine)
+# Limpeza periódica dos refresh tokens expirados
+refresh_token_sweeper = PeriodicTask(
+    purge_expired_refresh_tokens,
+    settings.REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS,
+    name="refresh-token-sweeper"
+)
+
+def build_indexes():
+    """Carrega os índices em memória a partir do banco."""
+    db = SessionLocal()
+    try:
+        build_from_db(db) # Índice de prefixos do autocomplete
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicialização e desligamento: tabelas, índices em memória e tarefas de fundo."""
+    # Criar tabelas no banco de dados (se não existirem)
+    # Em produção, considere usar Alembic para migrações
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        ensure_counters(db) # Contagens totais (calculadas só na primeira inicialização)
+    finally:
+        db.close()
+
+    if settings.FAST_START:
+        # A API já responde enquanto o índice é montado (o autocomplete começa vazio)
+        threading.Thread(target=build_indexes, name="index-build", daemon=True).start()
+    else:
+        build_indexes()
+    if settings.COMMENT_BATCHING_ENABLED:
+        comment_batcher.start()
+    refresh_token_sweeper.start()
+    yield
+    # Desligamento: grava os comentários que ainda estão na fila
+    comment_batcher.stop()
+    refresh_token_sweeper.stop()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API para gerenciamento de catálogo de filmes com autenticação e permissões.",
     version="1.1.0", 
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Incluir roteadores
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from ..database import Base
+
+class CatalogSyncEntry(Base):
+    """Estado da sincronização do catálogo: chave natural e hash do conteúdo de cada filme do feed."""
+    __tablename__ = "catalog_sync"
+
+    movie_id = Column(Integer, ForeignKey("movies.id"), primary_key=True)
+    # "ext:<id externo>" ou "<nome normalizado>|<ano>"
+    sync_key = Column(String(300), unique=True, index=True, nullable=False)
+    content_hash = Column(String(64), nullable=False) # SHA-256 dos campos do filme
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+class RowCounter(Base):
+    """Contagens mantidas nas próprias transações de escrita (ex: 'movies', 'comments:42')."""
+    __tablename__ = "row_counters"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
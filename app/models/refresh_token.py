@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from ..database import Base
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Apenas o HMAC-SHA256 do token é armazenado (hex, 64 caracteres)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # Tokens gerados a partir do mesmo login compartilham a família (revogada em caso de reuso)
+    family_id = Column(String(32), index=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True) # Preenchido ao rotacionar ou revogar
@@ -9,15 +9,22 @@ from datetime import timedelta, datetime, timezone # Adicionado datetime e timez
 from ..database import get_db
 from ..models.user import User
 # Importar schemas necessários, incluindo os novos PasswordResetRequest e PasswordReset
-from ..schemas import UserCreate, UserResponse, Token, PasswordResetRequest, PasswordReset
+from ..schemas import UserCreate, UserResponse, Token, PasswordResetRequest, PasswordReset, RefreshTokenRequest
+from ..models.refresh_token import RefreshToken
 from ..dependencies.security import (
     get_current_user,
     create_access_token,
     verify_password,
     get_password_hash,
-    create_password_reset_token # Função para gerar token de reset
+    create_password_reset_token, # Função para gerar token de reset
+    create_refresh_token,
+    rotate_refresh_token,
+    hash_refresh_token,
+    revoke_refresh_token_family,
+    revoke_user_refresh_tokens
 )
 from ..config import settings # Importar configurações
+from .. import counters
 
 router = APIRouter(
     prefix="/auth", # Definir prefixo aqui para todas as rotas de autenticação
@@ -29,7 +36,7 @@ def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    """Faz login do usuário e retorna um token JWT."""
+    """Faz login do usuário e retorna um token JWT de acesso e um refresh token."""
     user = db.query(User).filter(User.username == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
@@ -42,7 +49,33 @@ def login_for_access_token(
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = create_refresh_token(db, user.id)
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Renova o token de acesso sem reenviar a senha.
+    O refresh token é rotacionado: o enviado deixa de valer e um novo é retornado.
+    """
+    user, refresh_token = rotate_refresh_token(db, payload.refresh_token)
+    access_token = create_access_token(
+        data={"sub": user.username},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout", status_code=status.HTTP_200_OK)
+def logout(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Encerra a sessão revogando o refresh token (e os demais da mesma família)."""
+    stored = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(payload.refresh_token)
+    ).first()
+    if stored:
+        revoke_refresh_token_family(db, stored.family_id)
+        db.commit()
+    return {"message": "Sessão encerrada."}
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -61,6 +94,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(new_user)
+    counters.adjust(db, counters.USERS, 1)
     db.commit()
     db.refresh(new_user)
     return new_user
@@ -119,6 +153,9 @@ def reset_password(payload: PasswordReset, db: Session = Depends(get_db)):
     # Limpar o token de reset para que não possa ser reutilizado
     user.reset_password_token = None
     user.reset_password_token_expires_at = None
+
+    # Encerrar as sessões abertas com a senha antiga
+    revoke_user_refresh_tokens(db, user.id)
     
     db.commit()
 
@@ -1,14 +1,19 @@
 # Roteador para Comentários (Ajustado)
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Body
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Path, Body
 from sqlalchemy.orm import Session
 from typing import List
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..models.comment import Comment
 from ..models.movie import Movie # Para verificar se o filme existe
 from ..models.user import User # Para dependência de usuário logado
 from ..schemas import CommentCreate, CommentResponse # Importar do __init__.py dos schemas
 from ..dependencies.security import get_current_user # Dependência para usuário logado
+from ..autocomplete import comment_added # Popularidade usada no autocomplete
+from ..write_batch import WriteBatcher
+from ..config import settings
+from .. import counters
 
 router = APIRouter(
     prefix="/movies/{movie_id}/comments", # Aninhar comentários sob filmes
@@ -19,6 +24,22 @@ router = APIRouter(
     }
 )
 
+def count_comments(db: Session, comments: List[Comment]) -> None:
+    """Atualiza os contadores de comentários por filme na transação do lote."""
+    for movie_id, added in Counter(c.movie_id for c in comments).items():
+        counters.adjust(db, counters.comments_key(movie_id), added)
+
+# Agrupa inserções concorrentes em um único commit (iniciado no lifespan se COMMENT_BATCHING_ENABLED)
+comment_batcher = WriteBatcher(
+    Comment,
+    SessionLocal,
+    window_ms=settings.COMMENT_BATCH_WINDOW_MS,
+    max_rows=settings.COMMENT_BATCH_MAX_ROWS,
+    max_pending=settings.COMMENT_BATCH_MAX_PENDING,
+    submit_timeout=settings.COMMENT_BATCH_SUBMIT_TIMEOUT_SECONDS,
+    on_flush=count_comments,
+)
+
 # Função auxiliar para verificar se o filme existe
 def get_movie_or_404(movie_id: int, db: Session = Depends(get_db)) -> Movie:
     movie = db.query(Movie).filter(Movie.id == movie_id).first()
@@ -35,19 +56,34 @@ def create_comment(
     movie: Movie = Depends(get_movie_or_404) # Garante que o filme existe
 ):
     """Cria um novo comentário para um filme específico (requer autenticação)."""
+    # Com o agrupamento ativo, a resposta só sai depois do commit do lote
+    if comment_batcher.running:
+        # Devolve a conexão ao pool enquanto espera: o batcher precisa de uma para gravar
+        # (os atributos já carregados de current_user continuam acessíveis)
+        db.close()
+    comment_id = comment_batcher.submit(**comment.dict(), user_id=current_user.id, movie_id=movie_id)
+    if comment_id is not None:
+        comment_added(movie_id)
+        return {**comment.dict(), "id": comment_id, "movie_id": movie_id, "user_id": current_user.id, "user": current_user}
+
+    # Caminho direto: batcher desligado, fila cheia ou espera esgotada
     db_comment = Comment(**comment.dict(), user_id=current_user.id, movie_id=movie_id)
     db.add(db_comment)
+    counters.adjust(db, counters.comments_key(movie_id), 1)
     db.commit()
     db.refresh(db_comment)
+    comment_added(movie_id)
     # Carregar relacionamento para a resposta (se definido no schema)
     db.refresh(db_comment.user) 
     return db_comment
 
 @router.get("/", response_model=List[CommentResponse])
 def read_comments_for_movie(
+    response: Response,
     movie_id: int = Path(..., description="ID do filme para listar os comentários"),
     skip: int = 0,
     limit: int = 100,
+    include_total: bool = Query(True, description="Retornar o total no header X-Total-Count"),
     db: Session = Depends(get_db),
     movie: Movie = Depends(get_movie_or_404) # Garante que o filme existe
 ):
@@ -56,6 +92,8 @@ def read_comments_for_movie(
     # Carregar relacionamentos para a resposta (se definido no schema)
     for c in comments:
         db.refresh(c.user)
+    if include_total:
+        response.headers["X-Total-Count"] = str(counters.get(db, counters.comments_key(movie_id)))
     return comments
 
 @router.delete("/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -76,6 +114,8 @@ def delete_comment(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissão negada para deletar este comentário")
     
     db.delete(comment)
+    counters.adjust(db, counters.comments_key(movie_id), -1)
     db.commit()
+    comment_added(movie_id, -1)
     return None
 
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
 from ..models.movie import Movie
 from ..models.user import User # Para dependência de admin
-from ..schemas import MovieCreate, MovieResponse, MovieUpdate
+from ..schemas import (
+    MovieCreate, MovieResponse, MovieUpdate, MovieSuggestion,
+    MovieFilter, MovieBulkUpdate, MovieBulkResponse, MovieSyncItem, MovieSyncResult
+)
 from ..dependencies.security import get_admin_user # Dependência para verificar admin
+from ..config import settings
+from ..autocomplete import movie_index, index_movie, index_movies
+from ..catalog_sync import sync_catalog, CatalogSyncError
+from ..models.catalog_sync import CatalogSyncEntry
+from .. import counters
 
 router = APIRouter(
     prefix="/movies", # Definir prefixo aqui
@@ -13,6 +21,37 @@ router = APIRouter(
     responses={404: {"description": "Filme não encontrado"}} # Resposta padrão 404
 )
 
+# Máximo de IDs por cláusula IN (SQLite limita o número de parâmetros por consulta)
+IN_CHUNK_SIZE = 500
+
+# Colunas NOT NULL que o PATCH em lote não pode receber como null
+NON_NULLABLE_FIELDS = {
+    column.name for column in Movie.__table__.columns if not column.nullable and not column.primary_key
+}
+
+def reject_null_fields(changes: dict, where: str) -> None:
+    """400 se a alteração tenta gravar null em uma coluna obrigatória (evita falhar o lote inteiro no UPDATE)."""
+    null_fields = sorted(f for f in NON_NULLABLE_FIELDS if f in changes and changes[f] is None)
+    if null_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{where}: o(s) campo(s) {', '.join(null_fields)} não pode(m) ser null"
+        )
+
+def apply_movie_filters(query, filters: MovieFilter):
+    """Aplica os filtros da listagem (usando ilike para case-insensitive onde aplicável)."""
+    if filters.title:
+        query = query.filter(Movie.name.ilike(f"%{filters.title}%"))
+    if filters.director:
+        query = query.filter(Movie.director.ilike(f"%{filters.director}%"))
+    if filters.genre:
+        query = query.filter(Movie.genre.ilike(f"%{filters.genre}%"))
+    if filters.min_year:
+        query = query.filter(Movie.release_year >= filters.min_year)
+    if filters.max_year:
+        query = query.filter(Movie.release_year <= filters.max_year)
+    return query
+
 @router.post("/", response_model=MovieResponse, status_code=status.HTTP_201_CREATED)
 def create_movie(
     movie: MovieCreate,
@@ -22,8 +61,11 @@ def create_movie(
     """Cria um novo filme no catálogo (requer privilégios de admin)."""
     db_movie = Movie(**movie.dict())
     db.add(db_movie)
+    counters.adjust(db, counters.MOVIES, 1)
     db.commit()
     db.refresh(db_movie)
+    index_movie(db_movie)
+    counters.count_cache.clear()
     return db_movie
 
 @router.post("/json", response_model=List[MovieResponse], status_code=status.HTTP_201_CREATED)
@@ -35,14 +77,48 @@ def create_movies_json(
     """Cria múltiplos filmes no catálogo (requer privilégios de admin)."""
     db_movies = [Movie(**movie.dict()) for movie in movies]
     db.add_all(db_movies)
+    db.flush()
+    movie_ids = [movie.id for movie in db_movies]
+    counters.adjust(db, counters.MOVIES, len(db_movies))
     db.commit()
+    counters.count_cache.clear()
+    index_movies(db, movie_ids) # Uma única atualização do índice para o lote inteiro
     # Refresh para obter os IDs e campos atualizados
     for movie in db_movies:
         db.refresh(movie)
     return db_movies
 
+@router.post("/sync", response_model=MovieSyncResult)
+def sync_movies(
+    movies: List[MovieSyncItem],
+    delete_missing: bool = Query(True, description="Remover filmes sincronizados que não estão no feed"),
+    dry_run: bool = Query(False, description="Apenas calcular as alterações"),
+    force: bool = Query(False, description="Ignorar o limite de segurança de remoções e remover filmes com comentários"),
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Sincroniza o catálogo com o feed completo (requer privilégios de admin).
+    Casa os filmes pela chave natural (external_id ou nome + ano) e grava só o que mudou.
+    """
+    try:
+        result = sync_catalog(
+            db, [movie.dict() for movie in movies],
+            delete_missing=delete_missing, dry_run=dry_run, force=force
+        )
+    except CatalogSyncError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    if not dry_run:
+        index_movies(db, result["inserted_ids"] + result["updated_ids"])
+        for movie_id in result["deleted_ids"]:
+            movie_index.remove(movie_id)
+        counters.count_cache.clear()
+    return result
+
 @router.get("/", response_model=List[MovieResponse])
 def read_movies(
+    response: Response,
     skip: int = 0,
     limit: int = 1000,
     title: Optional[str] = Query(None, description="Filtrar por título (case-insensitive)"),
@@ -50,27 +126,36 @@ def read_movies(
     genre: Optional[str] = Query(None, description="Filtrar por gênero (case-insensitive)"),
     min_year: Optional[int] = Query(None, description="Filtrar por ano de lançamento mínimo"),
     max_year: Optional[int] = Query(None, description="Filtrar por ano de lançamento máximo"),
+    include_total: bool = Query(True, description="Retornar o total no header X-Total-Count"),
     db: Session = Depends(get_db)
 ):
     """Lista filmes com filtros e paginação."""
-    query = db.query(Movie)
-    
-    # Filtros (usando ilike para case-insensitive onde aplicável)
-    if title:
-        query = query.filter(Movie.name.ilike(f"%{title}%"))
-    if director:
-        query = query.filter(Movie.director.ilike(f"%{director}%"))
-    if genre:
-        query = query.filter(Movie.genre.ilike(f"%{genre}%"))
-    if min_year:
-        query = query.filter(Movie.release_year >= min_year)
-    if max_year:
-        query = query.filter(Movie.release_year <= max_year)
+    filters = MovieFilter(title=title, director=director, genre=genre, min_year=min_year, max_year=max_year)
+    query = apply_movie_filters(db.query(Movie), filters)
+
+    if include_total:
+        criteria = filters.dict(exclude_none=True)
+        if criteria:
+            # Com filtro: COUNT(*) guardado por alguns segundos
+            total = counters.count_cache.get_or_compute(
+                ("movies", tuple(sorted(criteria.items()))), query.count
+            )
+        else:
+            total = counters.get(db, counters.MOVIES) # Contador mantido nas escritas
+        response.headers["X-Total-Count"] = str(total)
     
     # Ordenação (ex: por ano de lançamento descendente)
     movies = query.order_by(Movie.release_year.desc(), Movie.name).offset(skip).limit(limit).all()
     return movies
 
+@router.get("/autocomplete", response_model=List[MovieSuggestion])
+def autocomplete_movies(
+    prefix: str = Query(..., min_length=1, description="Início do título ou do nome do diretor (ignora acentos e maiúsculas)"),
+    limit: int = Query(settings.AUTOCOMPLETE_DEFAULT_LIMIT, ge=1, le=settings.AUTOCOMPLETE_MAX_LIMIT),
+):
+    """Sugere filmes pelo prefixo do título ou do diretor, ordenados por popularidade (servido do índice em memória)."""
+    return movie_index.search(prefix, limit)
+
 @router.get("/{movie_id}", response_model=MovieResponse)
 def read_movie(movie_id: int, db: Session = Depends(get_db)):
     """Obtém os detalhes de um filme específico pelo ID."""
@@ -79,6 +164,27 @@ def read_movie(movie_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Filme não encontrado")
     return movie
 
+@router.get("/{movie_id}/similar", response_model=List[MovieResponse])
+def read_similar_movies(
+    movie_id: int,
+    limit: int = Query(10, ge=1, le=settings.SIMILARITY_TOP_K),
+    db: Session = Depends(get_db)
+):
+    """Lista filmes semelhantes, a partir do índice pré-calculado (python -m app.similarity)."""
+    from ..similarity import neighbor_table # Import tardio: evita carregar o NumPy na inicialização
+    neighbor_ids = neighbor_table.neighbors(movie_id, limit)
+    if neighbor_ids is None:
+        # Filme ausente do índice: 404 se não existir, senão ainda não foi indexado
+        if db.query(Movie.id).filter(Movie.id == movie_id).first() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Filme não encontrado")
+        return []
+    if not neighbor_ids:
+        return []
+
+    # Uma única consulta pela chave primária; mantém a ordem de similaridade
+    movies = {m.id: m for m in db.query(Movie).filter(Movie.id.in_(neighbor_ids)).all()}
+    return [movies[i] for i in neighbor_ids if i in movies]
+
 @router.put("/{movie_id}", response_model=MovieResponse)
 def update_movie(
     movie_id: int,
@@ -97,8 +203,76 @@ def update_movie(
     
     db.commit()
     db.refresh(db_movie)
+    index_movie(db_movie)
+    counters.count_cache.clear()
     return db_movie
 
+@router.patch("/bulk", response_model=MovieBulkResponse)
+def bulk_update_movies(
+    payload: MovieBulkUpdate,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user) # Apenas admin pode atualizar
+):
+    """
+    Atualiza vários filmes em uma única transação (requer privilégios de admin).
+    Aceita 'items' (lista de {id, ...campos}) ou 'filter' + 'changes'.
+    Retorna o resultado por ID.
+    """
+    if (payload.items is None) == (payload.filter is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe 'items' ou 'filter' + 'changes'")
+
+    if payload.items is not None:
+        # Mescla itens repetidos para o mesmo ID (o último vence)
+        changes_by_id = {}
+        for item in payload.items:
+            changes_by_id.setdefault(item.id, {}).update(item.dict(exclude_unset=True, exclude={"id"}))
+        for movie_id, changes in changes_by_id.items():
+            reject_null_fields(changes, f"Filme {movie_id}")
+        requested_ids = list(changes_by_id)
+        # Itens sem nenhum campo não alteram nada
+        unchanged_ids = {movie_id for movie_id, changes in changes_by_id.items() if not changes}
+
+        found_ids = set()
+        for i in range(0, len(requested_ids), IN_CHUNK_SIZE):
+            chunk = requested_ids[i:i + IN_CHUNK_SIZE]
+            found_ids.update(row.id for row in db.query(Movie.id).filter(Movie.id.in_(chunk)))
+
+        # UPDATE por chave primária via executemany (agrupado por conjunto de campos)
+        mappings = [dict(changes, id=movie_id) for movie_id, changes in changes_by_id.items()
+                    if movie_id in found_ids and changes]
+        if mappings:
+            db.bulk_update_mappings(Movie, mappings)
+    else:
+        if payload.changes is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe 'changes' junto com 'filter'")
+        if not payload.filter.dict(exclude_none=True):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="O filtro precisa de pelo menos um critério")
+        changes = payload.changes.dict(exclude_unset=True)
+        reject_null_fields(changes, "changes")
+
+        requested_ids = [row.id for row in apply_movie_filters(db.query(Movie.id), payload.filter)]
+        found_ids = set(requested_ids)
+        unchanged_ids = found_ids if not changes else set()
+        if changes:
+            for i in range(0, len(requested_ids), IN_CHUNK_SIZE):
+                chunk = requested_ids[i:i + IN_CHUNK_SIZE]
+                db.query(Movie).filter(Movie.id.in_(chunk)).update(changes, synchronize_session=False)
+
+    db.commit() # Um único commit para todo o lote
+
+    # Atualiza o índice do autocomplete uma única vez
+    updated_ids = [movie_id for movie_id in requested_ids if movie_id in found_ids and movie_id not in unchanged_ids]
+    index_movies(db, updated_ids)
+    counters.count_cache.clear()
+
+    def result_status(movie_id: int) -> str:
+        if movie_id not in found_ids:
+            return "not_found"
+        return "unchanged" if movie_id in unchanged_ids else "updated"
+
+    results = [{"id": movie_id, "status": result_status(movie_id)} for movie_id in requested_ids]
+    return {"updated": len(updated_ids), "results": results}
+
 @router.patch("/{movie_id}", response_model=MovieResponse)
 def partial_update_movie(
     movie_id: int,
@@ -118,6 +292,8 @@ def partial_update_movie(
 
     db.commit()
     db.refresh(db_movie)
+    index_movie(db_movie)
+    counters.count_cache.clear()
     return db_movie
 
 
@@ -132,8 +308,14 @@ def delete_movie(
     if movie is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Filme não encontrado")
     
+    # Esquece o estado de sincronização: se o feed ainda trouxer o filme, ele será recriado
+    db.query(CatalogSyncEntry).filter(CatalogSyncEntry.movie_id == movie_id).delete(synchronize_session=False)
+    counters.adjust(db, counters.MOVIES, -1)
+    counters.remove(db, [counters.comments_key(movie_id)])
     db.delete(movie)
     db.commit()
+    movie_index.remove(movie_id)
+    counters.count_cache.clear()
     # Retorna 204 No Content, sem corpo na resposta
     return None
 
@@ -1,12 +1,13 @@
 # Roteador para Usuários (Ajustado)
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from ..models.user import User
 from ..schemas import UserResponse 
 from ..dependencies.security import get_admin_user 
+from .. import counters
 
 router = APIRouter(
     prefix="/users", 
@@ -16,13 +17,17 @@ router = APIRouter(
 
 @router.get("/", response_model=List[UserResponse])
 def read_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    include_total: bool = Query(True, description="Retornar o total no header X-Total-Count"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_admin_user) # Apenas admin pode listar usuários
 ):
     """Lista todos os usuários registrados (requer privilégios de admin)."""
     users = db.query(User).offset(skip).limit(limit).all()
+    if include_total:
+        response.headers["X-Total-Count"] = str(counters.get(db, counters.USERS))
     return users
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 # ========= User Schemas =========
 
@@ -48,6 +48,48 @@ class MovieResponse(MovieBase):
     class Config:
         from_attributes = True
 
+class MovieBulkItem(MovieUpdate): # Um item da edição em lote: ID + campos a alterar
+    id: int
+
+class MovieFilter(BaseModel): # Mesmos filtros da listagem de filmes
+    title: Optional[str] = None
+    director: Optional[str] = None
+    genre: Optional[str] = None
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+
+class MovieBulkUpdate(BaseModel):
+    # Use 'items' (alterações por ID) OU 'filter' + 'changes' (mesma alteração para todos que casarem)
+    items: Optional[List[MovieBulkItem]] = None
+    filter: Optional[MovieFilter] = None
+    changes: Optional[MovieUpdate] = None
+
+class MovieBulkResult(BaseModel):
+    id: int
+    status: str # "updated", "unchanged" (nenhum campo enviado) ou "not_found"
+
+class MovieBulkResponse(BaseModel):
+    updated: int
+    results: List[MovieBulkResult]
+
+class MovieSyncItem(MovieBase): # Item do feed de sincronização do catálogo
+    external_id: Optional[str] = Field(None, max_length=200, description="ID no feed de origem (chave natural preferencial)")
+
+class MovieSyncResult(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    renamed: int # Incluídos em updated: chave mudou por correção de nome/ano
+    kept: int # Ausentes do feed, mantidos por terem comentários (remova com force)
+    unchanged: int
+    dry_run: bool
+    kept_ids: List[int] = []
+
+class MovieSuggestion(BaseModel): # Resultado do autocomplete
+    id: int
+    name: str
+    director: Optional[str] = None
+
 # ========= Comment Schemas =========
 
 class CommentBase(BaseModel):
@@ -70,6 +112,10 @@ class CommentResponse(CommentBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token recebido no login ou na última renovação")
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -1,12 +0,0 @@
-from pydantic import BaseModel
-
-class CommentCreate(BaseModel):
-    text: str
-
-class CommentResponse(CommentCreate):
-    id: int
-    user_id: int
-    movie_id: int
-
-    class Config:
-        orm_mode = True
\ No newline at end of file
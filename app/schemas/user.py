@@ -1,13 +0,0 @@
-from pydantic import BaseModel
-
-class UserCreate(BaseModel):
-    username: str
-    password: str
-    is_admin: bool = False
-
-class UserResponse(BaseModel):
-    username: str
-    is_admin: bool
-
-    class Config:
-        orm_mode = True
\ No newline at end of file
@@ -0,0 +1,392 @@
+# Índice pré-calculado de "filmes semelhantes"
+#
+# Construção (offline):   python -m app.similarity
+# Atualização incremental: python -m app.similarity --movies 12 57 98
+#
+# Cada filme vira um vetor (gênero, diretor, década e, opcionalmente, termos da
+# descrição) via feature hashing, então o índice pode ser atualizado sem refazer
+# vocabulário. Os top-K vizinhos por similaridade de cosseno são calculados em
+# blocos com NumPy e gravados em arquivos .npy lidos com memory-map pela API.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .autocomplete import fold
+from .config import settings
+from .models.movie import Movie
+
+# Dimensões de cada bloco do vetor de features
+GENRE_DIMS = 64
+DIRECTOR_DIMS = 64
+DECADE_DIMS = 16 # Décadas de 1880 a 2030
+DESCRIPTION_DIMS = 128
+
+# Peso relativo de cada bloco na similaridade
+GENRE_WEIGHT = 1.0
+DIRECTOR_WEIGHT = 0.8
+DECADE_WEIGHT = 0.5
+DESCRIPTION_WEIGHT = 0.6
+
+_FIRST_DECADE = 1880
+_GENRE_SPLIT = re.compile(r"\s*[,/|;]\s*")
+_WORD = re.compile(r"[a-z]{4,}")
+
+_NEIGHBORS_FILE = "neighbors.npy"
+_SCORES_FILE = "scores.npy"
+_ROW_OF_FILE = "row_of.npy"
+_IDS_FILE = "ids.npy"
+_FEATURES_FILE = "features.npy"
+_META_FILE = "meta.json"
+
+
+def _buckets(token: str, dims: int):
+    """
+    Duas posições por token (crc32 com sementes diferentes): dois tokens só se
+    confundem se colidirem nas duas. crc32 é estável entre processos (hash() do Python não é).
+    """
+    data = token.encode("utf-8")
+    return zlib.crc32(data) % dims, zlib.crc32(data, 0x9E3779B9) % dims
+
+
+def _normalize(block: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(block)
+    return block / norm if norm > 0 else block
+
+
+def feature_dims(use_description: bool) -> int:
+    dims = GENRE_DIMS + DIRECTOR_DIMS + DECADE_DIMS
+    return dims + DESCRIPTION_DIMS if use_description else dims
+
+
+def encode_movie(genre: Optional[str], director: Optional[str], release_year: Optional[int],
+                 description: Optional[str], use_description: bool) -> np.ndarray:
+    """Converte os metadados de um filme em um vetor float32 de norma 1 (ou nulo)."""
+    genre_vec = np.zeros(GENRE_DIMS, dtype=np.float32)
+    for g in _GENRE_SPLIT.split(fold(genre)):
+        if g:
+            genre_vec[list(_buckets(g, GENRE_DIMS))] += 1.0
+
+    director_vec = np.zeros(DIRECTOR_DIMS, dtype=np.float32)
+    if director:
+        director_vec[list(_buckets(fold(director), DIRECTOR_DIMS))] = 1.0
+
+    decade_vec = np.zeros(DECADE_DIMS, dtype=np.float32)
+    if release_year:
+        slot = min(max((release_year - _FIRST_DECADE) // 10, 0), DECADE_DIMS - 1)
+        decade_vec[slot] = 1.0
+        # Décadas vizinhas contam pela metade, para 1979 e 1981 ficarem próximos
+        if slot > 0:
+            decade_vec[slot - 1] = 0.5
+        if slot < DECADE_DIMS - 1:
+            decade_vec[slot + 1] = 0.5
+
+    blocks = [
+        _normalize(genre_vec) * GENRE_WEIGHT,
+        _normalize(director_vec) * DIRECTOR_WEIGHT,
+        _normalize(decade_vec) * DECADE_WEIGHT,
+    ]
+    if use_description:
+        desc_vec = np.zeros(DESCRIPTION_DIMS, dtype=np.float32)
+        for word in _WORD.findall(fold(description)):
+            desc_vec[list(_buckets(word, DESCRIPTION_DIMS))] += 1.0
+        blocks.append(_normalize(np.log1p(desc_vec)) * DESCRIPTION_WEIGHT)
+
+    return _normalize(np.concatenate(blocks))
+
+
+def _encode_rows(rows, use_description: bool):
+    ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+    features = np.zeros((len(rows), feature_dims(use_description)), dtype=np.float32)
+    for i, r in enumerate(rows):
+        features[i] = encode_movie(r.genre, r.director, r.release_year, r.description, use_description)
+    return ids, features
+
+
+def _load_rows(db: Session, movie_ids: Optional[Iterable[int]] = None) -> list:
+    query = db.query(Movie.id, Movie.genre, Movie.director, Movie.release_year, Movie.description)
+    if movie_ids is not None:
+        query = query.filter(Movie.id.in_(list(movie_ids)))
+    return query.order_by(Movie.id).all()
+
+
+def top_k(queries: np.ndarray, features: np.ndarray, k: int, query_rows: Optional[np.ndarray] = None,
+          block_size: int = 256):
+    """
+    Calcula os k vizinhos mais próximos (cosseno) de cada vetor em `queries`
+    contra `features`, em blocos para limitar o uso de memória.
+    `query_rows` indica a linha de cada consulta em `features`, para excluir o próprio filme.
+    Retorna (linhas, scores); posições sem vizinho têm linha -1.
+    """
+    n_queries, n_rows = len(queries), len(features)
+    k_eff = min(k, max(n_rows - 1, 0))
+    rows = np.full((n_queries, k), -1, dtype=np.int32)
+    scores = np.zeros((n_queries, k), dtype=np.float32)
+    if k_eff == 0:
+        return rows, scores
+
+    for start in range(0, n_queries, block_size):
+        end = min(start + block_size, n_queries)
+        sims = queries[start:end] @ features.T # (bloco, N)
+        if query_rows is not None:
+            sims[np.arange(end - start), query_rows[start:end]] = -np.inf
+        part = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        best = np.take_along_axis(part, order, axis=1)
+        best_scores = np.take_along_axis(part_scores, order, axis=1)
+        # Similaridade zero significa nenhum atributo em comum: não é vizinho
+        best[best_scores <= 0] = -1
+        rows[start:end, :k_eff] = best
+        scores[start:end, :k_eff] = np.maximum(best_scores, 0)
+    return rows, scores
+
+
+def _row_of(ids: np.ndarray) -> np.ndarray:
+    row_of = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+    row_of[ids] = np.arange(len(ids), dtype=np.int32)
+    return row_of
+
+
+def _read_meta(index_dir: str) -> Tuple[dict, str]:
+    """Lê o meta.json e retorna (meta, diretório da versão atual dos arquivos)."""
+    with open(os.path.join(index_dir, _META_FILE)) as f:
+        meta = json.load(f)
+    # Índices gravados antes do versionamento guardam os arquivos na raiz
+    return meta, os.path.join(index_dir, meta.get("version", ""))
+
+
+def _save(index_dir: str, ids, features, neighbors, scores, use_description: bool) -> None:
+    """
+    Grava o índice em um subdiretório novo e só então troca o meta.json, que aponta
+    para a versão atual: leitores nunca veem arquivos de versões diferentes misturados.
+    Mantém a versão anterior (pode estar aberta por quem ainda não recarregou).
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    try:
+        previous = _read_meta(index_dir)[0].get("version")
+    except FileNotFoundError:
+        previous = None
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(index_dir, version)
+    os.makedirs(version_dir)
+    arrays = {
+        _IDS_FILE: ids,
+        _FEATURES_FILE: features,
+        _NEIGHBORS_FILE: neighbors,
+        _SCORES_FILE: scores,
+        _ROW_OF_FILE: _row_of(ids),
+    }
+    for name, array in arrays.items():
+        with open(os.path.join(version_dir, name), "wb") as f:
+            np.save(f, array)
+    # O meta.json é gravado por último: os leitores recarregam quando ele muda
+    meta = {
+        "version": version,
+        "movies": int(len(ids)),
+        "k": int(neighbors.shape[1]) if neighbors.ndim == 2 else 0,
+        "use_description": use_description,
+        "built_at": time.time(),
+    }
+    tmp = os.path.join(index_dir, _META_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(index_dir, _META_FILE))
+
+    # Limpa versões antigas (e os arquivos da raiz, do formato sem versão)
+    for entry in os.listdir(index_dir):
+        path = os.path.join(index_dir, entry)
+        if entry in arrays:
+            os.remove(path)
+        elif entry.startswith("v") and os.path.isdir(path) and entry not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_index(db: Session, index_dir: Optional[str] = None, k: Optional[int] = None,
+                use_description: Optional[bool] = None) -> int:
+    """Reconstrói o índice completo. Retorna o número de filmes indexados."""
+    index_dir = index_dir or settings.SIMILARITY_INDEX_DIR
+    k = k or settings.SIMILARITY_TOP_K
+    if use_description is None:
+        use_description = settings.SIMILARITY_USE_DESCRIPTION
+
+    ids, features = _encode_rows(_load_rows(db), use_description)
+    rows, scores = top_k(features, features, k, query_rows=np.arange(len(ids)),
+                         block_size=settings.SIMILARITY_BLOCK_SIZE)
+    neighbors = np.where(rows >= 0, ids[np.maximum(rows, 0)], -1).astype(np.int64)
+    _save(index_dir, ids, features, neighbors, scores, use_description)
+    return len(ids)
+
+
+def update_index(db: Session, movie_ids: Iterable[int], index_dir: Optional[str] = None) -> int:
+    """
+    Atualização incremental após criar/alterar/remover filmes.
+    Recalcula os vizinhos dos filmes informados e os insere (ou remove) nas listas
+    dos demais, sem recalcular a matriz inteira; só as listas que citavam um filme
+    alterado são recalculadas por completo. Se os filmes alterados (ou as listas a
+    recalcular) forem uma fração grande do catálogo, refaz o índice inteiro. Retorna o número de filmes tocados.
+    """
+    index_dir = index_dir or settings.SIMILARITY_INDEX_DIR
+    if not os.path.exists(os.path.join(index_dir, _META_FILE)):
+        return build_index(db, index_dir)
+
+    meta, version_dir = _read_meta(index_dir)
+    use_description = meta["use_description"]
+    ids = np.load(os.path.join(version_dir, _IDS_FILE))
+    features = np.load(os.path.join(version_dir, _FEATURES_FILE))
+    neighbors = np.load(os.path.join(version_dir, _NEIGHBORS_FILE))
+    scores = np.load(os.path.join(version_dir, _SCORES_FILE))
+    k = neighbors.shape[1]
+
+    changed = sorted(set(int(i) for i in movie_ids))
+
+    # Remove filmes apagados e os que serão recodificados; novos vão para o fim
+    keep = ~np.isin(ids, changed)
+    neighbors, scores = neighbors[keep], scores[keep]
+    # Listas antigas que citavam filmes alterados/removidos perdem essas entradas
+    stale = np.isin(neighbors, changed)
+    lost = np.flatnonzero(stale.any(axis=1))
+
+    # Com muitos filmes alterados, ou listas a recalcular na maior parte do catálogo,
+    # o build completo sai mais barato
+    if len(changed) > settings.SIMILARITY_REBUILD_RATIO * len(ids) or len(lost) > len(ids) / 2:
+        build_index(db, index_dir, k=k, use_description=use_description)
+        return len(changed)
+
+    changed_rows = _load_rows(db, changed)
+    ids, features = ids[keep], features[keep]
+    new_ids, new_features = _encode_rows(changed_rows, use_description)
+    ids = np.concatenate([ids, new_ids])
+    features = np.concatenate([features, new_features])
+    scores[stale] = 0
+    neighbors[stale] = -1
+
+    # Vizinhos dos filmes alterados contra o catálogo inteiro
+    first_new = len(ids) - len(new_ids)
+    rows, new_scores = top_k(new_features, features, k,
+                             query_rows=np.arange(first_new, len(ids)),
+                             block_size=settings.SIMILARITY_BLOCK_SIZE)
+    new_neighbors = np.where(rows >= 0, ids[np.maximum(rows, 0)], -1)
+
+    # Cada filme existente pode ganhar um dos alterados como vizinho (em blocos de
+    # linhas, para a memória não crescer com N x alterados)
+    if len(new_ids) and first_new and k:
+        block_size = settings.SIMILARITY_BLOCK_SIZE
+        for start in range(0, first_new, block_size):
+            end = min(start + block_size, first_new)
+            sims = features[start:end] @ new_features.T # (bloco, alterados)
+            cand_ids = np.concatenate(
+                [neighbors[start:end], np.broadcast_to(new_ids, (end - start, len(new_ids)))], axis=1
+            )
+            cand_scores = np.concatenate([scores[start:end], sims], axis=1)
+            cand_scores[cand_ids < 0] = -np.inf
+            part = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            part_scores = np.take_along_axis(cand_scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1)
+            block_neighbors = np.take_along_axis(np.take_along_axis(cand_ids, part, axis=1), order, axis=1)
+            block_scores = np.take_along_axis(part_scores, order, axis=1)
+            empty = block_scores <= 0
+            block_neighbors[empty] = -1
+            block_scores[empty] = 0
+            neighbors[start:end] = block_neighbors
+            scores[start:end] = block_scores
+
+    # Listas que perderam vizinhos são recalculadas contra o catálogo inteiro, para
+    # não ficarem com menos de k vizinhos (ou com vizinhos piores que o próximo da fila)
+    if len(lost):
+        rows, lost_scores = top_k(features[lost], features, k, query_rows=lost,
+                                  block_size=settings.SIMILARITY_BLOCK_SIZE)
+        neighbors[lost] = np.where(rows >= 0, ids[np.maximum(rows, 0)], -1)
+        scores[lost] = lost_scores
+
+    neighbors = np.concatenate([neighbors, new_neighbors]).astype(np.int64)
+    scores = np.concatenate([scores, new_scores]).astype(np.float32)
+    order = np.argsort(ids, kind="stable")
+    _save(index_dir, ids[order], features[order], neighbors[order], scores[order], use_description)
+    return len(changed)
+
+
+class NeighborTable:
+    """Leitura O(1) da tabela de vizinhos via memory-map; recarrega quando o índice é regravado."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._mtime = None
+        # (row_of, neighbors) da mesma versão, trocados juntos em uma única atribuição
+        self._state: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        try:
+            mtime = os.stat(os.path.join(self.index_dir, _META_FILE)).st_mtime
+        except FileNotFoundError:
+            return self._state
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load(mtime)
+        return self._state
+
+    def _load(self, mtime: float) -> None:
+        try:
+            _, version_dir = _read_meta(self.index_dir)
+            row_of = np.load(os.path.join(version_dir, _ROW_OF_FILE), mmap_mode="r")
+            neighbors = np.load(os.path.join(version_dir, _NEIGHBORS_FILE), mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return # Gravação em andamento ou versão já removida: tenta de novo na próxima leitura
+        if len(row_of) and int(row_of.max()) >= len(neighbors):
+            return # Arquivos inconsistentes: mantém a versão anterior
+        self._state = (row_of, neighbors)
+        self._mtime = mtime
+
+    def neighbors(self, movie_id: int, limit: Optional[int] = None) -> Optional[List[int]]:
+        """IDs dos filmes semelhantes, do mais ao menos parecido; None se o filme não estiver indexado."""
+        state = self._refresh()
+        if state is None:
+            return None
+        row_of, neighbors = state
+        if movie_id < 0 or movie_id >= len(row_of) or row_of[movie_id] < 0:
+            return None
+        row = neighbors[row_of[movie_id]]
+        return [int(i) for i in row[:limit] if i >= 0]
+
+
+# Instância única compartilhada pela aplicação
+neighbor_table = NeighborTable(settings.SIMILARITY_INDEX_DIR)
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Constrói o índice de filmes semelhantes.")
+    parser.add_argument("--movies", type=int, nargs="+", help="Atualiza apenas estes IDs (incremental)")
+    parser.add_argument("--k", type=int, default=None, help="Vizinhos por filme (padrão: SIMILARITY_TOP_K)")
+    parser.add_argument("--description", action="store_true", default=None,
+                        help="Inclui termos da descrição nos vetores")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        if args.movies:
+            count = update_index(db, args.movies)
+            print(f"Índice atualizado para {count} filme(s)")
+        else:
+            count = build_index(db, k=args.k, use_description=args.description)
+            print(f"Índice construído com {count} filme(s)")
+        print(f"Tempo: {time.perf_counter() - started:.2f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Perfil de inicialização da aplicação
+#
+#   python -m app.startup_profile              # mede e lista os imports mais caros
+#   python -m app.startup_profile --runs 10 --budget-ms 800
+#   FAST_START=true python -m app.startup_profile   # modo de partida rápida
+#
+# Cada execução sobe um interpretador novo (partida a frio), importa app.main e
+# executa o lifespan (create_all, índices, tarefas de fundo). O comando termina com
+# código 1 se a mediana passar do orçamento (STARTUP_BUDGET_MS), para ser usado
+# como etapa de benchmark no CI.
+#
+# O filho usa um banco SQLite temporário (e um diretório de índice vazio), nunca o
+# DATABASE_URL configurado: create_all e as tarefas de fundo não tocam no banco de
+# desenvolvimento. Para medir com dados reais, passe --database-url com uma cópia.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .config import settings
+
+# Executado no processo filho: mede import e inicialização separadamente
+_CHILD_SCRIPT = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import app.main as main
+t1 = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+t2 = asyncio.run(startup())
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "lifespan_ms": (t2 - t1) * 1000}))
+"""
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_child(env: dict, importtime: bool = False):
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", _CHILD_SCRIPT]
+    started = time.perf_counter()
+    proc = subprocess.run(args, cwd=_PROJECT_ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao iniciar a aplicação:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = wall_ms
+    return result, proc.stderr
+
+
+def parse_importtime(stderr: str):
+    """Converte a saída de `-X importtime` em tuplas (módulo, próprio_us, acumulado_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização a frio da API.")
+    parser.add_argument("--runs", type=int, default=5, help="Número de partidas a frio medidas")
+    parser.add_argument("--budget-ms", type=float, default=settings.STARTUP_BUDGET_MS,
+                        help="Orçamento para import + lifespan (mediana)")
+    parser.add_argument("--top", type=int, default=15, help="Quantos imports listar")
+    parser.add_argument("--database-url", default=None,
+                        help="Banco usado pelo filho (padrão: SQLite temporário, apagado ao final)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="startup-profile-") as tmpdir:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'startup.db')}"
+        env["SIMILARITY_INDEX_DIR"] = os.path.join(tmpdir, "similarity_index")
+        return _profile(args, env)
+
+
+def _profile(args, env: dict) -> int:
+    # Perfil de imports (execução separada: -X importtime distorce os tempos)
+    _, stderr = _run_child(env, importtime=True)
+    rows = parse_importtime(stderr)
+    app_modules = [r for r in rows if r[0].split(".")[0] == "app"]
+    print(f"Imports mais caros (acumulado), de {len(rows)} módulos:")
+    for module, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+    print("Módulos do pacote app (tempo próprio):")
+    for module, self_us, cumulative_us in sorted(app_modules, key=lambda r: -r[1])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {module}")
+
+    samples = [_run_child(env)[0] for _ in range(args.runs)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    lifespan_ms = statistics.median(s["lifespan_ms"] for s in samples)
+    process_ms = statistics.median(s["process_ms"] for s in samples)
+    startup_ms = statistics.median(s["import_ms"] + s["lifespan_ms"] for s in samples)
+
+    print(f"\nMediana de {args.runs} partidas a frio:")
+    print(f"  import app.main : {import_ms:8.1f} ms")
+    print(f"  lifespan        : {lifespan_ms:8.1f} ms")
+    print(f"  processo inteiro: {process_ms:8.1f} ms")
+    print(f"  import+lifespan : {startup_ms:8.1f} ms (orçamento: {args.budget_ms:.0f} ms)")
+
+    if startup_ms > args.budget_ms:
+        print("ORÇAMENTO DE INICIALIZAÇÃO EXCEDIDO")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
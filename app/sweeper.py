@@ -0,0 +1,52 @@
+# Tarefas periódicas de manutenção executadas em uma thread de fundo
+
+import logging
+import threading
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Executa `job(db)` a cada `interval` segundos, com uma sessão própria."""
+
+    def __init__(self, job: Callable[[Session], object], interval: float, name: str):
+        self.job = job
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        db = SessionLocal()
+        try:
+            return self.job(db)
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        # wait() retorna True quando stop() é chamado
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.run_once()
+                logger.debug("%s: %s", self.name, result)
+            except Exception:
+                logger.exception("Falha na tarefa periódica %s", self.name)
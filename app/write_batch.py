@@ -0,0 +1,205 @@
+# Agrupamento de escritas (group commit) para inserções concorrentes
+#
+# Em SQLite só existe um escritor: cada commit é um fsync e, sob rajadas, as
+# requisições ficam esperando o lock do banco. O WriteBatcher junta as inserções
+# que chegam em uma janela curta (ou até N linhas) e grava todas em uma única
+# transação.
+#
+# Durabilidade: submit() só retorna depois do commit que contém a linha, então a
+# resposta ao cliente tem a mesma garantia de um commit direto. Se o commit do
+# lote falhar, cada linha é regravada em sua própria transação, para que uma
+# linha inválida não derrube as demais.
+#
+# Falhas da própria thread (ex: conexão perdida ao abrir a sessão) são repassadas
+# às linhas do lote e a thread segue rodando. Se ela parar, running volta a False e
+# as linhas na fila voltam ao chamador; submit() também desiste após
+# submit_timeout. Nos dois casos o chamador grava diretamente.
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, TimeoutError
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _close(db: Session) -> None:
+    # Falha ao devolver a conexão não deve afetar linhas já gravadas
+    try:
+        db.close()
+    except Exception:
+        logger.exception("Falha ao fechar a sessão do lote")
+
+
+class WriteBatcher:
+    """Thread de fundo que insere linhas de `model` em lotes e devolve o ID de cada uma."""
+
+    def __init__(self, model, session_factory: Callable[[], Session],
+                 window_ms: float = 5, max_rows: int = 100, max_pending: int = 10000,
+                 on_flush: Optional[Callable[[Session, list], None]] = None,
+                 submit_timeout: float = 5):
+        self.model = model
+        self.session_factory = session_factory
+        # Chamado com as linhas gravadas antes do commit, na mesma transação (ex: contadores)
+        self.on_flush = on_flush
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        # Espera máxima na fila antes de o chamador desistir e gravar diretamente
+        self.submit_timeout = submit_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock() # Garante que nada entra na fila depois do _STOP
+        self.running = False
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"write-batch-{self.model.__tablename__}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Para a thread depois de gravar tudo o que já estava na fila."""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, **values) -> Optional[int]:
+        """
+        Enfileira uma inserção e espera o commit do lote. Retorna o ID da nova linha,
+        ou None se o batcher estiver parado/lotado ou a linha não sair da fila em
+        `submit_timeout` segundos (o chamador deve gravar diretamente).
+        Exceções da gravação são repassadas ao chamador.
+        """
+        future: Future = Future()
+        with self._lock:
+            if not self.running:
+                return None
+            try:
+                self._queue.put_nowait((values, future))
+            except queue.Full:
+                return None
+        try:
+            return future.result(timeout=self.submit_timeout)
+        except TimeoutError:
+            # Só desiste se a linha ainda não entrou em um lote (senão seria gravada duas vezes)
+            if future.cancel():
+                return None
+            return future.result() # O lote já está gravando: o resultado sai em seguida
+        except CancelledError:
+            return None # Descartada da fila porque a thread parou
+
+    def _run(self) -> None:
+        batch = []
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_rows:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                # Ignora as linhas cujo chamador já desistiu; as demais não podem mais ser canceladas
+                batch = [(values, future) for values, future in batch if future.set_running_or_notify_cancel()]
+                try:
+                    self._flush(batch)
+                except Exception as exc:
+                    # Nenhuma falha derruba a thread: quem ainda espera recebe o erro
+                    logger.exception("Falha ao gravar lote de %s", self.model.__tablename__)
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+        finally:
+            # Se a thread sair por qualquer motivo, novas linhas vão direto ao banco
+            # e as que estavam na fila são devolvidas aos chamadores
+            with self._lock:
+                self.running = False
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("A thread de gravação em lote parou"))
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    item[1].cancel()
+
+    def _flush(self, batch) -> None:
+        if not batch:
+            return
+        try:
+            ids = self._commit_batch(batch)
+        except Exception:
+            ids = None
+        if ids is None:
+            self._flush_one_by_one(batch)
+            return
+        for (_, future), row_id in zip(batch, ids):
+            future.set_result(row_id)
+
+    def _commit_batch(self, batch) -> list:
+        db = self.session_factory()
+        try:
+            rows = [self.model(**values) for values, _ in batch]
+            db.add_all(rows)
+            db.flush()
+            ids = [row.id for row in rows] # Lidos antes do commit (que expira os objetos)
+            if self.on_flush:
+                self.on_flush(db, rows)
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            _close(db)
+
+    def _flush_one_by_one(self, batch) -> None:
+        """Fallback: uma transação por linha, propagando o erro só para quem falhou."""
+        for values, future in batch:
+            try:
+                row_id = self._commit_one(values)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(row_id)
+
+    def _commit_one(self, values: dict) -> int:
+        db = self.session_factory()
+        try:
+            row = self.model(**values)
+            db.add(row)
+            db.flush()
+            row_id = row.id
+            if self.on_flush:
+                self.on_flush(db, [row])
+            db.commit()
+            return row_id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            _close(db)